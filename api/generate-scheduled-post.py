@@ -6,7 +6,13 @@ import openai
 from datetime import datetime
 import pytz
 import random
+import sys
 import json
+import gzip
+
+# Share the renderer with the FastAPI backend that serves these posts
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+from post_renderer import publish_rendered_post
 
 class Handler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -89,29 +95,39 @@ class Handler(BaseHTTPRequestHandler):
                 "isContentGenerated": True
             }
 
+            # Render and compress once at publish time so readers get cached HTML
+            rendered = publish_rendered_post(db, content)
+            post["contentHash"] = rendered.content_hash
+
             # Save to Firebase
             doc_ref = db.collection('blogs').document()
             doc_ref.set(post)
 
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            self.wfile.write(json.dumps({
+            self.send_json(200, {
                 "success": True,
                 "message": f"Generated and published blog post: {subtopic}"
-            }).encode())
+            })
 
         except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            self.wfile.write(json.dumps({
+            self.send_json(500, {
                 "success": False,
                 "error": str(e)
-            }).encode())
+            })
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+        self.wfile.write(body)
@@ -6,6 +6,11 @@ import openai
 from datetime import datetime
 import pytz
 import random
+import sys
+
+# Share the renderer with the FastAPI backend that serves these posts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from post_renderer import publish_rendered_post
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -88,6 +93,10 @@ class handler(BaseHTTPRequestHandler):
                 "isContentGenerated": True
             }
 
+            # Render and compress once at publish time so readers get cached HTML
+            rendered = publish_rendered_post(db, content)
+            post["contentHash"] = rendered.content_hash
+
             # Save to Firebase
             doc_ref = db.collection('blogs').document()
             doc_ref.set(post)
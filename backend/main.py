@@ -1,6 +1,6 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from PIL import Image
 import io
 import numpy as np
@@ -11,6 +11,8 @@ import os
 from dotenv import load_dotenv
 from openai import OpenAI
 from typing import List, Optional
+from prompt_compiler import compile_blog_prompt, token_usage, MODEL as PROMPT_MODEL
+from post_renderer import RenderedPostCache, publish_rendered_post, negotiate_encoding, parse_range, etag_matches
 
 # Load environment variables
 load_dotenv()
@@ -41,6 +43,19 @@ client = OpenAI(
     api_key=os.getenv('OPENAI_API_KEY')
 )
 
+# Hot rendered posts are served from memory without touching Firestore
+rendered_post_cache = RenderedPostCache(capacity=256, ttl=300)
+
+def get_firestore():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    # Initialize Firebase if not already initialized
+    if not firebase_admin._apps:
+        cred = credentials.Certificate("serviceAccountKey.json")
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
 class PlantInfo(BaseModel):
     name: str
     health_score: float
@@ -51,6 +66,7 @@ class BlogContent(BaseModel):
     title: str
     content: str
     category: Optional[str] = None
+    target_words: Optional[int] = None
 
 class FarmingTool(BaseModel):
     name: str
@@ -141,46 +157,31 @@ async def generate_blog_content(data: BlogContent):
 
         print("Using OpenAI API key:", os.getenv('OPENAI_API_KEY')[:10] + "...")  # Debug log (first 10 chars only)
 
-        prompt = f"""Create a professional, engaging blog post about "{data.title}" in the style of Medium/Substack articles. Include:
-
-        1. A compelling introduction with a hook
-        2. Table of Contents with at least 5 main sections
-        3. For each section:
-           - Clear, well-formatted headings (use ## for main sections, ### for subsections)
-           - Engaging content with examples and real-world applications
-           - Where relevant, include:
-             * Markdown tables for comparing data/options
-             * Code snippets (if applicable)
-             * Bullet points for key ideas
-             * Blockquotes for important insights
-             * Suggested image placeholders with detailed descriptions (format: ![alt text][description of ideal image])
-        4. Expert Tips & Best Practices (in a formatted table)
-        5. Common Mistakes to Avoid (as a bulleted list)
-        6. Key Takeaways (in a summary box)
-        7. Related Resources section including:
-           - 2-3 relevant YouTube video suggestions with descriptions
-           - Recommended books or articles
-           - Useful tools or products (if applicable)
-        
-        Context: {data.content}
-        Category: {data.category or 'Gardening'}
-        
-        Format everything in clean, properly spaced markdown with clear section breaks.
-        Make the content visually engaging with a mix of different markdown elements.
-        Include suggested places for images with detailed descriptions in markdown format."""
+        compiled = compile_blog_prompt(
+            data.title,
+            data.content,
+            category=data.category,
+            target_words=data.target_words,
+        )
+        print(f"Prompt tokens: {compiled.prompt_tokens}, max_tokens: {compiled.max_tokens}, truncated: {compiled.truncated}")  # Debug log
 
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo-16k",
-            messages=[
-                {"role": "system", "content": "You are a professional content creator who specializes in creating engaging, visually rich blog posts. You excel at using markdown to create well-structured, easy-to-read content with a perfect mix of text, tables, quotes, and suggested media placements."},
-                {"role": "user", "content": prompt}
-            ],
+            model=PROMPT_MODEL,
+            messages=compiled.messages,
             temperature=0.7,
-            max_tokens=4000
+            max_tokens=compiled.max_tokens
         )
+        finish_reason = response.choices[0].finish_reason
+        token_usage.record(compiled, response.usage, finish_reason)
 
         generated_content = response.choices[0].message.content
 
+        # Render now so the first read of the saved post is served from the stored render
+        try:
+            publish_rendered_post(get_firestore(), generated_content)
+        except Exception as e:
+            print(f"Error rendering generated content: {str(e)}")
+
         # Parse the content to extract sections and media suggestions
         sections = []
         current_section = ""
@@ -201,6 +202,13 @@ async def generate_blog_content(data: BlogContent):
         return {
             'content': generated_content,
             'sections': sections,
+            'usage': {
+                **compiled.usage(),
+                'completion_tokens': response.usage.completion_tokens if response.usage else None,
+                'billed_prompt_tokens': response.usage.prompt_tokens if response.usage else None,
+                'finish_reason': finish_reason,
+                'output_truncated': finish_reason == 'length',
+            },
             'status': 'success'
         }
 
@@ -208,6 +216,65 @@ async def generate_blog_content(data: BlogContent):
         print(f"Error generating content: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def serve_rendered_post(collection: str, post_id: str, request: Request):
+    cache_key = f"{collection}/{post_id}"
+    rendered = rendered_post_cache.get(cache_key)
+    if rendered is None:
+        db = get_firestore()
+        snapshot = db.collection(collection).document(post_id).get()
+        if not snapshot.exists:
+            raise HTTPException(status_code=404, detail="Post not found")
+        post = snapshot.to_dict()
+        markdown_text = post.get('generatedContent') or post.get('content') or ''
+
+        # Reuses the render stored at publish time; older posts are rendered on first read
+        rendered = publish_rendered_post(db, markdown_text)
+        rendered_post_cache.put(cache_key, rendered)
+
+    encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+    body = rendered.encoded(encoding)
+    etag = rendered.etag(encoding)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'public, max-age=300',
+        'Vary': 'Accept-Encoding',
+        'Accept-Ranges': 'bytes',
+    }
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, len(body))
+        except ValueError:
+            headers['Content-Range'] = f"bytes */{len(body)}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers['Content-Range'] = f"bytes {start}-{end}/{len(body)}"
+            return Response(content=body[start:end + 1], status_code=206, media_type="text/html; charset=utf-8", headers=headers)
+
+    return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
+
+# Posts published by the Vercel cron function
+@app.get("/blogs/{post_id}/html")
+def get_blog_html(post_id: str, request: Request):
+    return serve_rendered_post('blogs', post_id, request)
+
+# Posts published by backend/scheduler/blog_scheduler.py
+@app.get("/posts/{post_id}/html")
+def get_post_html(post_id: str, request: Request):
+    return serve_rendered_post('posts', post_id, request)
+
+@app.get("/token-usage")
+async def get_token_usage():
+    return token_usage.snapshot()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,222 @@
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+
+import bleach
+import brotli
+import markdown
+
+RENDERED_COLLECTION = "rendered_posts"
+
+# Bump whenever the markdown extensions or sanitizer allowlists change so
+# stored renders and client ETags from the old renderer stop matching
+RENDERER_VERSION = 2
+
+# toc gives headings ids so the generated Table of Contents can link to them
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists", "toc"]
+
+ALLOWED_TAGS = list(bleach.sanitizer.ALLOWED_TAGS) + [
+    "p", "br", "hr", "pre", "img", "span", "div",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+    "table", "thead", "tbody", "tr", "th", "td",
+    "dl", "dt", "dd", "sup", "sub",
+]
+
+ALLOWED_ATTRIBUTES = {
+    **bleach.sanitizer.ALLOWED_ATTRIBUTES,
+    "img": ["src", "alt", "title"],
+    "th": ["align"],
+    "td": ["align"],
+    "code": ["class"],
+    "h1": ["id"], "h2": ["id"], "h3": ["id"],
+    "h4": ["id"], "h5": ["id"], "h6": ["id"],
+}
+
+
+@dataclass
+class RenderedPost:
+    content_hash: str
+    html: bytes
+    gzip: bytes
+    br: bytes
+
+    def etag(self, encoding="identity"):
+        """Strong validator for one content coding; each coding has its own bytes"""
+        if encoding == "identity":
+            return f'"{self.content_hash}"'
+        return f'"{self.content_hash}-{encoding}"'
+
+    def encoded(self, encoding):
+        """Return the body for a content coding (br, gzip or identity)"""
+        if encoding == "br":
+            return self.br
+        if encoding == "gzip":
+            return self.gzip
+        return self.html
+
+    def to_document(self):
+        return {
+            "contentHash": self.content_hash,
+            "html": self.html,
+            "gzip": self.gzip,
+            "br": self.br,
+        }
+
+    @classmethod
+    def from_document(cls, data):
+        return cls(
+            content_hash=data["contentHash"],
+            html=data["html"],
+            gzip=data["gzip"],
+            br=data["br"],
+        )
+
+
+def content_hash(markdown_text):
+    """Key for a render of this markdown by the current renderer version"""
+    digest = hashlib.sha256(markdown_text.encode("utf-8")).hexdigest()
+    return f"v{RENDERER_VERSION}-{digest}"
+
+
+def render_post(markdown_text):
+    """Render markdown to sanitized HTML and precompress it"""
+    html = markdown.markdown(markdown_text, extensions=MARKDOWN_EXTENSIONS)
+    html = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True)
+    body = html.encode("utf-8")
+    return RenderedPost(
+        content_hash=content_hash(markdown_text),
+        html=body,
+        # mtime=0 keeps the gzip bytes identical for identical content
+        gzip=gzip.compress(body, compresslevel=9, mtime=0),
+        br=brotli.compress(body, quality=11),
+    )
+
+
+def load_rendered_post(db, digest):
+    """Fetch a previously rendered post by content hash, or None"""
+    snapshot = db.collection(RENDERED_COLLECTION).document(digest).get()
+    if not snapshot.exists:
+        return None
+    return RenderedPost.from_document(snapshot.to_dict())
+
+
+def store_rendered_post(db, rendered):
+    """Save a rendered post keyed by its content hash"""
+    db.collection(RENDERED_COLLECTION).document(rendered.content_hash).set(rendered.to_document())
+
+
+def publish_rendered_post(db, markdown_text):
+    """Render a post once and store it, reusing any existing render of the same content"""
+    digest = content_hash(markdown_text)
+    rendered = load_rendered_post(db, digest)
+    if rendered is None:
+        rendered = render_post(markdown_text)
+        store_rendered_post(db, rendered)
+    return rendered
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick br, gzip or identity from an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return opaque(etag) in [opaque(tag) for tag in if_none_match.split(",")]
+
+
+def parse_range(range_header, length):
+    """Parse a single "bytes=" range into (start, end) inclusive.
+
+    Returns None when the header should be ignored and the full body served,
+    or raises ValueError when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    if length == 0:
+        raise ValueError("Range not satisfiable")
+
+    start, _, end = spec.partition("-")
+    if not (start.isdigit() or start == "") or not (end.isdigit() or end == ""):
+        return None
+    if start == "":
+        if end == "":
+            return None
+        suffix = int(end)
+        if suffix == 0:
+            raise ValueError("Range not satisfiable")
+        return max(length - suffix, 0), length - 1
+
+    start = int(start)
+    if start >= length:
+        raise ValueError("Range not satisfiable")
+    end = int(end) if end else length - 1
+    if start > end:
+        return None
+    return start, min(end, length - 1)
+
+
+class RenderedPostCache:
+    """Thread-safe LRU of rendered posts keyed by post id.
+
+    Post documents are edited outside the backend, so entries are never
+    invalidated explicitly; the TTL bounds how long edited content is stale.
+    """
+
+    def __init__(self, capacity=256, ttl=300):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, post_id):
+        with self._lock:
+            entry = self._entries.get(post_id)
+            if entry is None:
+                return None
+            rendered, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[post_id]
+                return None
+            self._entries.move_to_end(post_id)
+            return rendered
+
+    def put(self, post_id, rendered):
+        with self._lock:
+            self._entries[post_id] = (rendered, time.monotonic())
+            self._entries.move_to_end(post_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
@@ -0,0 +1,272 @@
+import time
+from dataclasses import dataclass, asdict
+
+import tiktoken
+
+MODEL = "gpt-3.5-turbo-16k"
+CONTEXT_WINDOW = 16385
+
+# Hard cap on everything we send (system + instructions + user context)
+PROMPT_TOKEN_BUDGET = 3000
+
+# Every chat message costs a few tokens of framing on top of its content
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+# Roughly how many tokens an English word of markdown costs
+TOKENS_PER_WORD = 1.4
+
+# Title and category are interpolated into the prompt, so they are capped too
+MAX_TITLE_TOKENS = 64
+MAX_CATEGORY_TOKENS = 16
+
+# Rough character-per-token ratio used when the tokenizer cannot be loaded
+CHARS_PER_TOKEN = 4
+
+MIN_COMPLETION_TOKENS = 800
+MAX_COMPLETION_TOKENS = 4000
+
+# The instructions ask for 7 parts (intro, TOC, 5+ sections, tips table,
+# mistakes, takeaways, resources), which needs the full 4000 tokens
+DEFAULT_COMPLETION_TOKENS = 4000
+
+# Completion budget per blog category, keyed by the categories stored on
+# posts; unknown categories get the full default
+CATEGORY_COMPLETION_TOKENS = {
+    # Feed and generated posts
+    "generated": 4000,
+    "scientific": 4000,
+    "professional": 4000,
+    "educational": 3500,
+    # Gardening sample posts
+    "Urban Gardening": 3500,
+    "Vegetables": 3500,
+    "Sustainability": 3500,
+    "Herbs": 3000,
+    "Design": 3000,
+    "Tropical": 3000,
+    "Wildlife": 3000,
+    "Xeriscaping": 3000,
+    # Scheduled windsurfing posts
+    "Windsurfing Techniques": 3500,
+    "Windsurfing Destinations": 3000,
+    "Windsurfing Lifestyle": 3000,
+    "Equipment Reviews": 3500,
+    "Equipment Guide": 3500,
+    "Weather and Conditions": 3000,
+}
+
+TRUNCATION_MARKER = "\n[...context truncated...]\n"
+
+# The system and instruction segments never change between requests so the
+# provider can reuse its cached prefix; only the final user message varies.
+SYSTEM_PROMPT = "You are a professional content creator who specializes in creating engaging, visually rich blog posts. You excel at using markdown to create well-structured, easy-to-read content with a perfect mix of text, tables, quotes, and suggested media placements."
+
+INSTRUCTION_PROMPT = """Create a professional, engaging blog post in the style of Medium/Substack articles. Include:
+
+1. A compelling introduction with a hook
+2. Table of Contents with at least 5 main sections
+3. For each section:
+   - Clear, well-formatted headings (use ## for main sections, ### for subsections)
+   - Engaging content with examples and real-world applications
+   - Where relevant, include:
+     * Markdown tables for comparing data/options
+     * Code snippets (if applicable)
+     * Bullet points for key ideas
+     * Blockquotes for important insights
+     * Suggested image placeholders with detailed descriptions (format: ![alt text][description of ideal image])
+4. Expert Tips & Best Practices (in a formatted table)
+5. Common Mistakes to Avoid (as a bulleted list)
+6. Key Takeaways (in a summary box)
+7. Related Resources section including:
+   - 2-3 relevant YouTube video suggestions with descriptions
+   - Recommended books or articles
+   - Useful tools or products (if applicable)
+
+Format everything in clean, properly spaced markdown with clear section breaks.
+Make the content visually engaging with a mix of different markdown elements.
+Include suggested places for images with detailed descriptions in markdown format.
+The article topic, category and context follow in the next message."""
+
+
+@dataclass
+class CompiledPrompt:
+    messages: list
+    max_tokens: int
+    prompt_tokens: int
+    context_tokens: int
+    original_context_tokens: int
+    truncated: bool
+    title_truncated: bool
+
+    def usage(self):
+        """Token accounting for this request, without the message bodies"""
+        data = asdict(self)
+        data.pop("messages")
+        return data
+
+
+class _CharEncoding:
+    """Stand-in tokenizer that treats every few characters as one token"""
+
+    def encode(self, text):
+        return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+# Seconds to wait before trying to load the tokenizer again after a failure
+TOKENIZER_RETRY_SECONDS = 300
+
+_encodings = {}
+_encoding_retry_at = {}
+
+
+def _encoding(model):
+    if model in _encodings:
+        return _encodings[model]
+    if time.monotonic() < _encoding_retry_at.get(model, 0):
+        return _CharEncoding()
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use; estimate until it can
+        print(f"Tokenizer unavailable, estimating tokens from length: {e}")
+        _encoding_retry_at[model] = time.monotonic() + TOKENIZER_RETRY_SECONDS
+        return _CharEncoding()
+    _encodings[model] = encoding
+    return encoding
+
+
+def count_tokens(text, model=MODEL):
+    """Count tokens locally with the model's tokenizer"""
+    return len(_encoding(model).encode(text))
+
+
+def count_message_tokens(messages, model=MODEL):
+    """Count tokens for a list of chat messages including per-message framing"""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + count_tokens(message["content"], model)
+    return total
+
+
+def clip_to_tokens(text, limit, model=MODEL):
+    """Cut text down to its first `limit` tokens"""
+    encoding = _encoding(model)
+    tokens = encoding.encode(text)
+    if len(tokens) <= limit:
+        return text
+    return encoding.decode(tokens[:limit])
+
+
+def truncate_to_tokens(text, limit, model=MODEL):
+    """Trim text to at most `limit` tokens, keeping its head and tail"""
+    encoding = _encoding(model)
+    tokens = encoding.encode(text)
+    if len(tokens) <= limit:
+        return text
+
+    marker_tokens = len(encoding.encode(TRUNCATION_MARKER))
+    if limit <= marker_tokens:
+        # No room for the marker, so keep what fits of the head
+        return encoding.decode(tokens[:limit])
+    keep = limit - marker_tokens
+    head = keep * 2 // 3
+    tail = keep - head
+    trimmed = encoding.decode(tokens[:head]) + TRUNCATION_MARKER
+    if tail:
+        trimmed += encoding.decode(tokens[-tail:])
+    return trimmed
+
+
+def completion_budget(category=None, target_words=None):
+    """Pick max_tokens from the requested length, falling back to the category"""
+    if target_words:
+        tokens = int(target_words * TOKENS_PER_WORD)
+    else:
+        tokens = CATEGORY_COMPLETION_TOKENS.get(category, DEFAULT_COMPLETION_TOKENS)
+    return max(MIN_COMPLETION_TOKENS, min(tokens, MAX_COMPLETION_TOKENS))
+
+
+def _user_message(title, context, category):
+    return f'Title: "{title}"\nCategory: {category}\n\nContext: {context}'
+
+
+def compile_blog_prompt(title, context, category=None, target_words=None,
+                        budget=PROMPT_TOKEN_BUDGET, model=MODEL):
+    """Build the chat messages for a blog post within the token budget"""
+    category = clip_to_tokens(category or "Gardening", MAX_CATEGORY_TOKENS, model)
+    clipped_title = clip_to_tokens(title, MAX_TITLE_TOKENS, model)
+    title_truncated = clipped_title != title
+    title = clipped_title
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": INSTRUCTION_PROMPT},
+    ]
+
+    # Whatever the fixed segments and the title leave over goes to the context
+    fixed_tokens = count_message_tokens(
+        messages + [{"role": "user", "content": _user_message(title, "", category)}],
+        model,
+    )
+    original_context_tokens = count_tokens(context, model)
+    context_limit = max(budget - fixed_tokens, 0)
+    truncated = original_context_tokens > context_limit
+    if truncated:
+        context = truncate_to_tokens(context, context_limit, model)
+
+    messages.append({"role": "user", "content": _user_message(title, context, category)})
+    prompt_tokens = count_message_tokens(messages, model)
+
+    max_tokens = completion_budget(category, target_words)
+    max_tokens = min(max_tokens, CONTEXT_WINDOW - prompt_tokens)
+
+    return CompiledPrompt(
+        messages=messages,
+        max_tokens=max_tokens,
+        prompt_tokens=prompt_tokens,
+        context_tokens=count_tokens(context, model),
+        original_context_tokens=original_context_tokens,
+        truncated=truncated,
+        title_truncated=title_truncated,
+    )
+
+
+class TokenUsageTracker:
+    """Running totals of estimated and billed tokens for this process"""
+
+    def __init__(self):
+        self.requests = 0
+        self.truncated_requests = 0
+        self.estimated_prompt_tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.length_limited_completions = 0
+
+    def record(self, compiled, usage=None, finish_reason=None):
+        self.requests += 1
+        self.truncated_requests += int(compiled.truncated or compiled.title_truncated)
+        self.length_limited_completions += int(finish_reason == "length")
+        self.estimated_prompt_tokens += compiled.prompt_tokens
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "truncated_requests": self.truncated_requests,
+            "estimated_prompt_tokens": self.estimated_prompt_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "length_limited_completions": self.length_limited_completions,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+
+token_usage = TokenUsageTracker()
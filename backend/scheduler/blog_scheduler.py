@@ -11,6 +11,11 @@ import os
 from dotenv import load_dotenv
 import sys
 
+# Make the backend modules importable when run as scheduler/blog_scheduler.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from post_renderer import publish_rendered_post
+from runtime import SchedulerRuntime, ControlServer
+
 load_dotenv()
 
 # Initialize Firebase if not already initialized
@@ -21,6 +26,13 @@ if not firebase_admin._apps:
 db = firestore.client()
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+# Scheduler runtime settings
+CONTROL_HOST = os.getenv('SCHEDULER_CONTROL_HOST', '127.0.0.1')
+CONTROL_PORT = int(os.getenv('SCHEDULER_CONTROL_PORT', '8765'))
+JOB_JITTER_SECONDS = 300
+MISFIRE_GRACE_SECONDS = 3600
+DRAIN_TIMEOUT_SECONDS = 900
+
 # List of blog topics and their subtopics
 BLOG_TOPICS = {
     "Windsurfing Techniques": [
@@ -91,30 +103,39 @@ async def generate_blog_post(topic, subtopic):
 
 async def publish_blog_post(post):
     """Save the blog post to Firebase"""
+    return await publish_blog_posts([post])
+
+async def publish_blog_posts(posts):
+    """Save a batch of blog posts to Firebase in a single atomic write"""
     try:
-        doc_ref = db.collection('posts').document()
-        doc_ref.set(post)
-        print(f"Published post: {post['title']}")
+        batch = db.batch()
+        for post in posts:
+            # Render and compress once at publish time so readers get cached HTML
+            rendered = publish_rendered_post(db, post['content'])
+            post['contentHash'] = rendered.content_hash
+            batch.set(db.collection('posts').document(), post)
+        batch.commit()
+        for post in posts:
+            print(f"Published post: {post['title']}")
         return True
     except Exception as e:
-        print(f"Error publishing blog post: {e}")
+        print(f"Error publishing blog posts: {e}")
         return False
 
 async def generate_daily_posts():
     """Generate and publish two blog posts"""
     print(f"Starting daily blog post generation at {datetime.now()}")
     
-    # Select two random topics
+    # Select two random topics, each with a random subtopic
     topics = random.sample(list(BLOG_TOPICS.keys()), 2)
+    selections = [(topic, random.choice(BLOG_TOPICS[topic])) for topic in topics]
     
-    for topic in topics:
-        # Select a random subtopic
-        subtopic = random.choice(BLOG_TOPICS[topic])
-        
-        # Generate and publish post
-        post = await generate_blog_post(topic, subtopic)
-        if post:
-            await publish_blog_post(post)
+    # Generate both posts together, then publish them as one batch so an
+    # interrupted run never leaves half of it published
+    posts = await asyncio.gather(*(generate_blog_post(topic, subtopic) for topic, subtopic in selections))
+    posts = [post for post in posts if post]
+    if posts:
+        await publish_blog_posts(posts)
     
     print("Completed daily blog post generation")
 
@@ -140,32 +161,52 @@ async def test_post_generation():
     else:
         print("Failed to generate test post")
 
-def start_scheduler():
-    """Start the scheduler for daily blog post generation"""
-    scheduler = AsyncIOScheduler()
+async def run_scheduler():
+    """Run the scheduler until SIGINT/SIGTERM, then drain in-flight runs"""
+    runtime = SchedulerRuntime(generate_daily_posts, drain_timeout=DRAIN_TIMEOUT_SECONDS)
+    runtime.install_signal_handlers()
+
+    scheduler = AsyncIOScheduler(
+        timezone=pytz.UTC,
+        job_defaults={
+            'coalesce': True,
+            'max_instances': 1,
+            'misfire_grace_time': MISFIRE_GRACE_SECONDS,
+        },
+    )
     
     # Schedule first post at 9:00 AM UTC
     scheduler.add_job(
-        generate_daily_posts,
-        CronTrigger(hour=9, minute=0),
+        runtime.run_job,
+        CronTrigger(hour=9, minute=0, timezone=pytz.UTC, jitter=JOB_JITTER_SECONDS),
+        args=['morning_post'],
         id='morning_post'
     )
     
     # Schedule second post at 3:00 PM UTC
     scheduler.add_job(
-        generate_daily_posts,
-        CronTrigger(hour=15, minute=0),
+        runtime.run_job,
+        CronTrigger(hour=15, minute=0, timezone=pytz.UTC, jitter=JOB_JITTER_SECONDS),
+        args=['afternoon_post'],
         id='afternoon_post'
     )
     
+    control = ControlServer(runtime, scheduler, host=CONTROL_HOST, port=CONTROL_PORT)
+    await control.start()
     scheduler.start()
     print("Blog post scheduler started")
     
-    # Keep the scheduler running
-    try:
-        asyncio.get_event_loop().run_forever()
-    except (KeyboardInterrupt, SystemExit):
-        pass
+    # Keep the scheduler running until asked to stop
+    await runtime.stopping.wait()
+    print("Shutting down blog post scheduler...")
+    scheduler.shutdown(wait=False)
+    await control.stop()
+    await runtime.drain()
+    print("Blog post scheduler stopped")
+
+def start_scheduler():
+    """Start the scheduler for daily blog post generation"""
+    asyncio.run(run_scheduler())
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "test":
@@ -0,0 +1,262 @@
+import asyncio
+import bisect
+import json
+import signal
+import time
+from datetime import datetime
+
+import pytz
+
+# Upper bounds in seconds; GPT-4 batches usually take one to five minutes
+DURATION_BUCKETS = [10, 30, 60, 120, 300, 600, 1200, 1800]
+
+MANUAL_JOB_ID = "manual"
+
+
+class DurationHistogram:
+    """Cumulative histogram of job durations, Prometheus style"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"buckets": buckets, "count": self.count, "sum": round(self.sum, 3)}
+
+
+class SchedulerRuntime:
+    """Supervises blog generation runs.
+
+    Every run, scheduled or on demand, goes through `submit` so that runs
+    never overlap, are counted in the queue and are drained on shutdown.
+    Scheduled runs are always queued (APScheduler's max_instances bounds
+    them); at most one manual run may be queued or running at a time.
+    """
+
+    def __init__(self, job, drain_timeout=900):
+        self.job = job
+        self.drain_timeout = drain_timeout
+        self.histograms = {}
+        self.last_runs = {}
+        self.started_at = datetime.now(pytz.UTC)
+        self.current_run = None
+        self.queued = 0
+        self.stopping = asyncio.Event()
+        self._run_lock = asyncio.Lock()
+        self._tasks = set()
+        self._manual_task = None
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    @property
+    def manual_pending(self):
+        return self._manual_task is not None and not self._manual_task.done()
+
+    def submit(self, job_id):
+        """Queue a scheduled run and return its task, or None when shutting down"""
+        if self.stopping.is_set():
+            return None
+        self.queued += 1
+        task = asyncio.get_running_loop().create_task(self._supervise(job_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def submit_manual(self):
+        """Queue an on-demand run, or return None if one is already pending"""
+        if self.manual_pending:
+            return None
+        task = self.submit(MANUAL_JOB_ID)
+        if task is not None:
+            self._manual_task = task
+        return task
+
+    async def run_job(self, job_id):
+        """Entry point for scheduler triggers"""
+        task = self.submit(job_id)
+        if task is None:
+            print(f"Skipping {job_id}: runtime is stopping")
+            return
+        await asyncio.shield(task)
+
+    async def _supervise(self, job_id):
+        acquired = False
+        try:
+            async with self._run_lock:
+                acquired = True
+                self.queued -= 1
+                if self.stopping.is_set():
+                    # Shutdown began while this run was queued; don't start a new batch
+                    print(f"Dropping queued run {job_id}: runtime is stopping")
+                    return
+                self.current_run = {"job_id": job_id, "startedAt": datetime.now(pytz.UTC).isoformat()}
+                started = time.monotonic()
+                status = "success"
+                try:
+                    await self.job()
+                except asyncio.CancelledError:
+                    status = "cancelled"
+                    raise
+                except Exception as e:
+                    status = "error"
+                    print(f"Error in scheduled run {job_id}: {e}")
+                finally:
+                    duration = time.monotonic() - started
+                    self.histograms.setdefault(job_id, DurationHistogram()).observe(duration)
+                    self.last_runs[job_id] = {
+                        "status": status,
+                        "duration": round(duration, 3),
+                        "finishedAt": datetime.now(pytz.UTC).isoformat(),
+                    }
+                    self.current_run = None
+        finally:
+            # Runs cancelled while still waiting for the lock leave the queue here
+            if not acquired:
+                self.queued -= 1
+
+    async def drain(self):
+        """Let in-flight runs finish, cancelling them after the drain timeout"""
+        if not self._tasks:
+            return
+        print(f"Draining {len(self._tasks)} scheduled run(s)...")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+        if pending:
+            self.cancel_all()
+            await asyncio.gather(*pending, return_exceptions=True)
+            print(f"Cancelled {len(pending)} run(s) after {self.drain_timeout}s")
+
+    def cancel_all(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def _on_signal(self):
+        if self.stopping.is_set():
+            # A second signal during the drain stops waiting for in-flight runs
+            print("Second stop signal received, cancelling in-flight runs")
+            self.cancel_all()
+            return
+        self.stopping.set()
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._on_signal)
+
+    def status(self, scheduler=None):
+        data = {
+            "startedAt": self.started_at.isoformat(),
+            "stopping": self.stopping.is_set(),
+            "currentRun": self.current_run,
+            "queueDepth": self.queued,
+            "inFlight": self.in_flight,
+            "manualPending": self.manual_pending,
+            "lastRuns": self.last_runs,
+        }
+        if scheduler is not None:
+            data["jobs"] = [
+                {
+                    "id": job.id,
+                    "nextRunTime": job.next_run_time.isoformat() if job.next_run_time else None,
+                }
+                for job in scheduler.get_jobs()
+            ]
+        return data
+
+    def metrics(self):
+        return {job_id: histogram.snapshot() for job_id, histogram in self.histograms.items()}
+
+
+class ControlServer:
+    """Minimal local HTTP control surface for the scheduler.
+
+    GET  /status   runtime and job status
+    GET  /queue    queue depth and in-flight runs
+    GET  /metrics  per-job duration histograms
+    POST /run-now  queue an immediate run
+    """
+
+    def __init__(self, runtime, scheduler=None, host="127.0.0.1", port=8765):
+        self.runtime = runtime
+        self.scheduler = scheduler
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"Scheduler control server listening on http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def route(self, method, path):
+        if method == "GET" and path == "/status":
+            return 200, self.runtime.status(self.scheduler)
+        if method == "GET" and path == "/queue":
+            return 200, {"queueDepth": self.runtime.queued, "inFlight": self.runtime.in_flight}
+        if method == "GET" and path == "/metrics":
+            return 200, self.runtime.metrics()
+        if method == "POST" and path == "/run-now":
+            if self.runtime.stopping.is_set():
+                return 503, {"success": False, "error": "Runtime is stopping"}
+            task = self.runtime.submit_manual()
+            if task is None:
+                return 409, {"success": False, "error": "A manual run is already queued or running"}
+            return 202, {"success": True, "queueDepth": self.runtime.queued}
+        if path in ("/status", "/queue", "/metrics", "/run-now"):
+            return 405, {"success": False, "error": "Method not allowed"}
+        return 404, {"success": False, "error": "Not found"}
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            parts = request_line.decode("latin-1").split()
+            # Skip the headers; none of the routes take a body
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            if len(parts) < 2:
+                status, payload = 400, {"success": False, "error": "Bad request"}
+            else:
+                status, payload = self.route(parts[0].upper(), parts[1].split("?")[0])
+
+            body = json.dumps(payload).encode()
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+_REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    503: "Service Unavailable",
+}
@@ -0,0 +1,151 @@
+import asyncio
+
+from runtime import MANUAL_JOB_ID, ControlServer, DurationHistogram, SchedulerRuntime
+
+
+class FakeJob:
+    """Stand-in for generate_daily_posts that records overlap"""
+
+    def __init__(self, duration=0.05):
+        self.duration = duration
+        self.starts = 0
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self):
+        self.starts += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.duration)
+        finally:
+            self.active -= 1
+
+
+def test_histogram_is_cumulative():
+    histogram = DurationHistogram(buckets=[1, 10])
+    for seconds in (0.5, 1, 5, 50):
+        histogram.observe(seconds)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 2, "10": 3, "+Inf": 4}
+    assert snapshot["count"] == 4
+    assert snapshot["sum"] == 56.5
+
+
+def test_runs_never_overlap():
+    job = FakeJob()
+
+    async def main():
+        runtime = SchedulerRuntime(job)
+        tasks = [runtime.submit(job_id) for job_id in ("morning_post", "afternoon_post", "morning_post")]
+        assert runtime.queued == 3
+        await asyncio.gather(*tasks)
+        return runtime
+
+    runtime = asyncio.run(main())
+    assert job.starts == 3
+    assert job.peak == 1
+    assert runtime.queued == 0
+    assert runtime.metrics()["morning_post"]["count"] == 2
+    assert runtime.last_runs["afternoon_post"]["status"] == "success"
+
+
+def test_only_one_manual_run_at_a_time():
+    job = FakeJob()
+
+    async def main():
+        runtime = SchedulerRuntime(job)
+        first = runtime.submit_manual()
+        assert first is not None
+        assert runtime.submit_manual() is None
+        await first
+        assert not runtime.manual_pending
+        assert runtime.submit_manual() is not None
+        await runtime.drain()
+
+    asyncio.run(main())
+    assert job.starts == 2
+
+
+def test_manual_runs_never_block_scheduled_runs():
+    job = FakeJob()
+
+    async def main():
+        runtime = SchedulerRuntime(job)
+        server = ControlServer(runtime)
+        statuses = [server.route("POST", "/run-now")[0] for _ in range(4)]
+        assert statuses == [202, 409, 409, 409]
+        await runtime.run_job("morning_post")
+        return runtime
+
+    runtime = asyncio.run(main())
+    assert job.starts == 2
+    assert set(runtime.last_runs) == {MANUAL_JOB_ID, "morning_post"}
+
+
+def test_queued_runs_are_dropped_once_stopping():
+    job = FakeJob(duration=0.1)
+
+    async def main():
+        runtime = SchedulerRuntime(job)
+        runtime.submit("morning_post")
+        runtime.submit("afternoon_post")
+        await asyncio.sleep(0.01)
+        runtime.stopping.set()
+        assert runtime.submit("manual") is None
+        await runtime.drain()
+        return runtime
+
+    runtime = asyncio.run(main())
+    assert job.starts == 1
+    assert runtime.queued == 0
+    assert list(runtime.last_runs) == ["morning_post"]
+
+
+def test_drain_cancels_after_timeout():
+    job = FakeJob(duration=10)
+
+    async def main():
+        runtime = SchedulerRuntime(job, drain_timeout=0.05)
+        runtime.submit("morning_post")
+        await asyncio.sleep(0.01)
+        runtime.stopping.set()
+        await runtime.drain()
+        return runtime
+
+    runtime = asyncio.run(main())
+    assert runtime.last_runs["morning_post"]["status"] == "cancelled"
+    assert runtime.in_flight == 0
+
+
+def test_second_signal_cancels_in_flight_runs():
+    job = FakeJob(duration=10)
+
+    async def main():
+        runtime = SchedulerRuntime(job, drain_timeout=60)
+        runtime.submit("morning_post")
+        await asyncio.sleep(0.01)
+        runtime._on_signal()
+        assert runtime.stopping.is_set()
+        drain = asyncio.ensure_future(runtime.drain())
+        await asyncio.sleep(0.01)
+        runtime._on_signal()
+        await asyncio.wait_for(drain, timeout=1)
+        return runtime
+
+    runtime = asyncio.run(main())
+    assert runtime.last_runs["morning_post"]["status"] == "cancelled"
+
+
+def test_control_routes():
+    async def main():
+        runtime = SchedulerRuntime(FakeJob())
+        server = ControlServer(runtime)
+        assert server.route("GET", "/queue") == (200, {"queueDepth": 0, "inFlight": 0})
+        assert server.route("GET", "/status")[1]["manualPending"] is False
+        assert server.route("GET", "/run-now")[0] == 405
+        assert server.route("GET", "/missing")[0] == 404
+        runtime.stopping.set()
+        assert server.route("POST", "/run-now")[0] == 503
+
+    asyncio.run(main())
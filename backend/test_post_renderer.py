@@ -0,0 +1,162 @@
+import gzip
+
+import brotli
+import pytest
+
+import post_renderer
+from post_renderer import (
+    RENDERED_COLLECTION,
+    RenderedPostCache,
+    content_hash,
+    etag_matches,
+    negotiate_encoding,
+    parse_range,
+    publish_rendered_post,
+    render_post,
+)
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, store, key):
+        self._store = store
+        self._key = key
+
+    def get(self):
+        return FakeSnapshot(self._store.get(self._key))
+
+    def set(self, data):
+        self._store[self._key] = dict(data)
+
+
+class FakeCollection:
+    def __init__(self, store):
+        self._store = store
+
+    def document(self, key):
+        return FakeDocument(self._store, key)
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        return FakeCollection(self.collections.setdefault(name, {}))
+
+
+def test_render_sanitizes_and_compresses():
+    rendered = render_post("## Intro\n\n|a|b|\n|-|-|\n|1|2|\n\n<script>alert(1)</script>")
+    html = rendered.html.decode()
+    assert '<h2 id="intro">Intro</h2>' in html
+    assert "<table>" in html
+    assert "<script>" not in html
+    assert gzip.decompress(rendered.gzip) == rendered.html
+    assert brotli.decompress(rendered.br) == rendered.html
+
+
+def test_render_is_deterministic():
+    assert render_post("# Same").gzip == render_post("# Same").gzip
+
+
+def test_content_hash_includes_renderer_version(monkeypatch):
+    before = content_hash("# Post")
+    monkeypatch.setattr(post_renderer, "RENDERER_VERSION", post_renderer.RENDERER_VERSION + 1)
+    assert content_hash("# Post") != before
+
+
+def test_etags_differ_per_encoding():
+    rendered = render_post("# Post")
+    etags = {rendered.etag(encoding) for encoding in ("identity", "gzip", "br")}
+    assert len(etags) == 3
+
+
+def test_etag_matches_uses_weak_comparison():
+    etag = '"v2-abc-br"'
+    assert etag_matches('"v2-abc-br"', etag)
+    assert etag_matches('W/"v2-abc-br"', etag)
+    assert etag_matches('"other", W/"v2-abc-br"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"v2-abc-gzip"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_publish_stores_once_and_reuses(monkeypatch):
+    db = FakeFirestore()
+    first = publish_rendered_post(db, "# Post")
+    assert list(db.collections[RENDERED_COLLECTION]) == [first.content_hash]
+
+    def fail(markdown_text):
+        raise AssertionError("should reuse the stored render")
+
+    monkeypatch.setattr(post_renderer, "render_post", fail)
+    second = publish_rendered_post(db, "# Post")
+    assert second == first
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip, br;q=0", "gzip"),
+    ("br;q=0, gzip;q=0", "identity"),
+    ("*", "br"),
+    ("", "identity"),
+    (None, "identity"),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=40-", (40, 49)),
+    ("bytes=-10", (40, 49)),
+    ("bytes=-100", (0, 49)),
+    ("bytes=10-500", (10, 49)),
+    ("bytes=10-5", None),
+    ("bytes=0-1,5-6", None),
+    ("bytes=a-", None),
+    ("items=0-1", None),
+    (None, None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 50) == expected
+
+
+@pytest.mark.parametrize("header, length", [
+    ("bytes=100-", 50),
+    ("bytes=50-60", 50),
+    ("bytes=-0", 50),
+    ("bytes=-1", 0),
+    ("bytes=0-", 0),
+])
+def test_parse_range_unsatisfiable(header, length):
+    with pytest.raises(ValueError):
+        parse_range(header, length)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = RenderedPostCache(capacity=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(post_renderer.time, "monotonic", lambda: now[0])
+    cache = RenderedPostCache(ttl=10)
+    cache.put("a", 1)
+    now[0] += 11
+    assert cache.get("a") is None
@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import pytest
+
+import prompt_compiler
+from prompt_compiler import (
+    CHARS_PER_TOKEN,
+    DEFAULT_COMPLETION_TOKENS,
+    MAX_COMPLETION_TOKENS,
+    MAX_TITLE_TOKENS,
+    MIN_COMPLETION_TOKENS,
+    PROMPT_TOKEN_BUDGET,
+    TRUNCATION_MARKER,
+    TokenUsageTracker,
+    compile_blog_prompt,
+    completion_budget,
+    count_tokens,
+    truncate_to_tokens,
+)
+
+
+@pytest.fixture(autouse=True)
+def char_encoding(monkeypatch):
+    # Pin the offline fallback so counts are deterministic and need no network
+    monkeypatch.setattr(prompt_compiler, "_encoding", lambda model: prompt_compiler._CharEncoding())
+
+
+def test_count_tokens_uses_character_estimate():
+    assert count_tokens("a" * (CHARS_PER_TOKEN * 10)) == 10
+
+
+def test_truncate_keeps_short_text():
+    assert truncate_to_tokens("short text", 100) == "short text"
+
+
+def test_truncate_keeps_head_and_tail_with_marker():
+    text = "H" * 400 + "T" * 400
+    trimmed = truncate_to_tokens(text, 50)
+    assert TRUNCATION_MARKER in trimmed
+    assert trimmed.startswith("H")
+    assert trimmed.endswith("T")
+    assert count_tokens(trimmed) <= 50
+
+
+def test_truncate_without_room_for_marker():
+    trimmed = truncate_to_tokens("x" * 400, 2)
+    assert TRUNCATION_MARKER not in trimmed
+    assert count_tokens(trimmed) <= 2
+    assert truncate_to_tokens("x" * 400, 0) == ""
+
+
+def test_completion_budget_by_category():
+    assert completion_budget("Herbs") == 3000
+    assert completion_budget("generated") == 4000
+    assert completion_budget("Unknown Category") == DEFAULT_COMPLETION_TOKENS
+    assert completion_budget(None) == DEFAULT_COMPLETION_TOKENS
+
+
+def test_completion_budget_by_target_words_is_clamped():
+    assert completion_budget("Herbs", target_words=1000) == 1400
+    assert completion_budget(target_words=10) == MIN_COMPLETION_TOKENS
+    assert completion_budget(target_words=100000) == MAX_COMPLETION_TOKENS
+
+
+def test_compile_small_prompt_is_untouched():
+    compiled = compile_blog_prompt("Tomatoes", "Growing tomatoes indoors", "Vegetables")
+    assert not compiled.truncated
+    assert not compiled.title_truncated
+    assert compiled.context_tokens == compiled.original_context_tokens
+    assert compiled.max_tokens == 3500
+    assert "Growing tomatoes indoors" in compiled.messages[-1]["content"]
+
+
+def test_compile_keeps_static_prefix():
+    first = compile_blog_prompt("Tomatoes", "one", "Herbs")
+    second = compile_blog_prompt("Basil", "two", "Vegetables")
+    assert first.messages[:2] == second.messages[:2]
+    assert all(message["role"] == "system" for message in first.messages[:2])
+
+
+def test_compile_enforces_budget_on_context():
+    compiled = compile_blog_prompt("Tomatoes", "ctx " * 20000, "Herbs")
+    assert compiled.truncated
+    assert compiled.prompt_tokens <= PROMPT_TOKEN_BUDGET
+    assert compiled.context_tokens < compiled.original_context_tokens
+
+
+def test_compile_enforces_budget_on_title():
+    compiled = compile_blog_prompt("T" * 16000, "ctx " * 20000, "Herbs")
+    assert compiled.title_truncated
+    assert compiled.prompt_tokens <= PROMPT_TOKEN_BUDGET
+    assert f'"{"T" * MAX_TITLE_TOKENS * CHARS_PER_TOKEN}"' in compiled.messages[-1]["content"]
+
+
+def test_compile_with_no_context_room_drops_marker():
+    compiled = compile_blog_prompt("Tomatoes", "some context", budget=10)
+    assert compiled.truncated
+    assert compiled.context_tokens == 0
+    assert TRUNCATION_MARKER not in compiled.messages[-1]["content"]
+
+
+def test_usage_excludes_messages():
+    usage = compile_blog_prompt("Tomatoes", "ctx").usage()
+    assert "messages" not in usage
+    assert usage["prompt_tokens"] > 0
+
+
+def test_tracker_records_usage_and_length_limited_completions():
+    tracker = TokenUsageTracker()
+    compiled = compile_blog_prompt("Tomatoes", "ctx " * 20000)
+    tracker.record(compiled, SimpleNamespace(prompt_tokens=100, completion_tokens=50), "length")
+    tracker.record(compiled, None, "stop")
+    snapshot = tracker.snapshot()
+    assert snapshot["requests"] == 2
+    assert snapshot["truncated_requests"] == 2
+    assert snapshot["length_limited_completions"] == 1
+    assert snapshot["total_tokens"] == 150